@@ -1,52 +1,259 @@
-from google.ads.googleads.client import GoogleAdsClient
-from google.ads.googleads.errors import GoogleAdsException
 import os
-from typing import List, Dict
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, wraps
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+from urllib.parse import urlparse
+import aiohttp
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+from bs4 import BeautifulSoup, SoupStrainer
 import re
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    # grpc/protobuf and the googleads proto tree take hundreds of ms to import,
+    # so the runtime imports are deferred to first use below
+    from google.ads.googleads.client import GoogleAdsClient
+    from google.oauth2.credentials import Credentials
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Cap on in-flight website fetches across all requests in this worker process
+SCRAPE_SEM = asyncio.Semaphore(int(os.getenv("SCRAPE_CONCURRENCY", "10")))
+
+# Per-host token bucket so repeated scrapes of one site don't trip 429s or bans.
+# Buckets are per worker process, so N uvicorn workers allow N x rate per host.
+_HOST_RATE = float(os.getenv("SCRAPE_HOST_RATE", "1"))
+# Longest a fetch waits for its host's token before giving up (matches the HTTP timeout)
+_HOST_WAIT_TIMEOUT = 10
+# Hosts come from client input, so keep the limiter map bounded
+_LIMITERS: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+
+def _host_limiter(host: str) -> AsyncLimiter:
+    """Return the token bucket for `host`, creating it on first use"""
+    limiter = _LIMITERS.get(host)
+    if limiter is None:
+        # One token per 1/rate seconds; a fractional max_rate can never be acquired
+        limiter = _LIMITERS[host] = AsyncLimiter(1, 1 / _HOST_RATE)
+    return limiter
+
+# Upper bound on how much of each page is downloaded for seed extraction
+_MAX_PAGE_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(128 * 1024)))
+
+# Pages that fill the download cap are parsed in a separate process instead of a thread
+_PROCESS_PARSE_THRESHOLD = _MAX_PAGE_BYTES
+# Each uvicorn worker gets its own pool, so keep it small to avoid workers x cores processes
+_PARSE_POOL_SIZE = min(2, os.cpu_count() or 1)
+_PARSE_POOL: Optional[ProcessPoolExecutor] = None
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Return the process pool for large-page parses, starting it on first use"""
+    global _PARSE_POOL
+    if _PARSE_POOL is None:
+        # Spawn rather than fork: by now this process runs threads (to_thread, aiohttp's
+        # resolver), and forking a multi-threaded process can deadlock the child
+        _PARSE_POOL = ProcessPoolExecutor(
+            max_workers=_PARSE_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _PARSE_POOL
+
+_WORD_RE = re.compile(r'\b[a-zA-Z]{3,}\b')
+_STOP_WORDS = frozenset({'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'her', 'was', 'one', 'our', 'had', 'words', 'use', 'each', 'which', 'she', 'how', 'its', 'said', 'from', 'they', 'this', 'been', 'have', 'their', 'with', 'that'})
+
+# Ad group classifiers, one scan per keyword. Word boundaries keep terms like
+# "cvs pharmacy" out of competitor terms; for typical keywords grouping is unchanged.
+_COMPETITOR_RE = re.compile(r'\b(vs|versus|compared|alternatives?)\b')
+_LOCATION_RE = re.compile(r'near me|local|city|area')
+
+# Mock keyword idea parameters
+_SUFFIXES = ('', ' online', ' shop', ' buy', ' best', ' reviews')
+_BASE_VOLUMES = (1000, 2500, 5000, 1200, 800, 3200, 4500, 600, 1800, 2200)
+_COMPETITIONS = ('LOW', 'MEDIUM', 'HIGH')
+
+# Assume 2% conversion rate as per requirements
+_CONVERSION_RATE = 0.02
+
+# Tags seed keywords are read from
+_SEED_TAGS = ['title', 'meta', 'h1', 'h2', 'h3']
+
+def _mock_seed_metrics(seed_keywords: List[str]):
+    """Yield (seed, metrics) for the mock data; metrics are shared by all suffix variants"""
+    nb, nc = len(_BASE_VOLUMES), len(_COMPETITIONS)
+    for i, seed in enumerate(seed_keywords):
+        yield seed, {
+            'search_volume': _BASE_VOLUMES[i % nb] + i * 100,
+            'competition': _COMPETITIONS[i % nc],
+            'cpc_low': round(0.5 + (i * 0.3), 2),
+            'cpc_high': round(1.2 + (i * 0.4), 2),
+        }
+
+def _iter_seed_texts(soup: BeautifulSoup):
+    """Yield text from title, meta description, h1, h2, h3 tags in document order"""
+    seen_title = seen_description = False
+    
+    # Name the tags explicitly: find_all(True) would also visit spans/links inside headings
+    for tag in soup.find_all(_SEED_TAGS):
+        if tag.name == 'title':
+            if not seen_title:
+                seen_title = True
+                yield tag.string or tag.get_text(' ', strip=True)
+        elif tag.name == 'meta':
+            if not seen_description and tag.get('name') == 'description':
+                seen_description = True
+                yield tag.get('content', '')
+        else:
+            # tag.string avoids a subtree walk when the heading is plain text
+            yield tag.string or tag.get_text(' ', strip=True)
+
+def _parse_seeds(content: bytes) -> List[str]:
+    """Extract seed keywords from raw HTML"""
+    # Only build the tags we read from
+    strainer = SoupStrainer(_SEED_TAGS)
+    soup = BeautifulSoup(content, 'lxml', parse_only=strainer)
+    
+    keywords = []
+    seen = set()
+    for text in _iter_seed_texts(soup):
+        # Tokenize each tag on its own rather than joining the whole page
+        for word in _WORD_RE.findall(text.lower()):
+            if word in seen or word in _STOP_WORDS:
+                continue
+            seen.add(word)
+            keywords.append(word)
+            if len(keywords) == 10:  # Return top 10
+                return keywords
+    
+    return keywords
+
+def _async_ttl_cache(key=hashkey, maxsize: int = 1024, ttl: int = 3600):
+    """Cache coroutine method results for `ttl` seconds, keyed on the arguments after self.
+
+    The cache lives in this worker process; uvicorn workers do not share it.
+
+    Concurrent misses on the same key share one lock, so only the first caller
+    hits the backend and the rest read its result. Empty results are not cached.
+    """
+    def decorator(func):
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        locks: Dict = {}
+        
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            k = key(*args, **kwargs)
+            if k in cache:
+                return cache[k]
+            lock = locks.setdefault(k, asyncio.Lock())
+            try:
+                async with lock:
+                    if k in cache:
+                        return cache[k]
+                    result = await func(self, *args, **kwargs)
+                    if result:
+                        cache[k] = result
+                    return result
+            finally:
+                if locks.get(k) is lock:
+                    del locks[k]
+        
+        return wrapper
+    return decorator
+
+_TOKEN_URI = "https://oauth2.googleapis.com/token"
+_ADS_SCOPES = ["https://www.googleapis.com/auth/adwords"]
+
+@lru_cache(maxsize=1)
+def get_ads_credentials() -> "Credentials":
+    """Build OAuth credentials once; google-auth refreshes only when expired"""
+    from google.oauth2.credentials import Credentials
+    
+    return Credentials(
+        token=None,
+        refresh_token=os.getenv("GOOGLE_ADS_REFRESH_TOKEN"),
+        client_id=os.getenv("GOOGLE_ADS_CLIENT_ID"),
+        client_secret=os.getenv("GOOGLE_ADS_CLIENT_SECRET"),
+        token_uri=_TOKEN_URI,
+        scopes=_ADS_SCOPES,
+    )
+
+@lru_cache(maxsize=1)
+def get_ads_client() -> "GoogleAdsClient":
+    """Return the process-wide Google Ads client, built on first use"""
+    from google.ads.googleads.client import GoogleAdsClient
+    
+    # Create client from environment variables instead of YAML file
+    return GoogleAdsClient(
+        credentials=get_ads_credentials(),
+        developer_token=os.getenv("GOOGLE_ADS_DEVELOPER_TOKEN"),
+        use_proto_plus=True,  # This was the missing required setting
+    )
+
+def _google_ads_exception() -> type:
+    """Import GoogleAdsException only when an except clause needs to match it"""
+    from google.ads.googleads.errors import GoogleAdsException
+    return GoogleAdsException
+
 class KeywordPlannerService:
     def __init__(self):
-        # Create client from environment variables instead of YAML file
-        self.client = GoogleAdsClient.load_from_dict({
-            "developer_token": os.getenv("GOOGLE_ADS_DEVELOPER_TOKEN"),
-            "client_id": os.getenv("GOOGLE_ADS_CLIENT_ID"),
-            "client_secret": os.getenv("GOOGLE_ADS_CLIENT_SECRET"),
-            "refresh_token": os.getenv("GOOGLE_ADS_REFRESH_TOKEN"),
-            "use_proto_plus": True,  # This was the missing required setting
-        })
         self.customer_id = os.getenv("GOOGLE_ADS_CUSTOMER_ID")
+        # Shared HTTP session, opened lazily on the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared aiohttp session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            # Keep idle connections and DNS answers around so repeat hosts skip TCP/TLS setup
+            connector = aiohttp.TCPConnector(limit=20, limit_per_host=4, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'},
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self._session
+    
+    async def close(self):
+        """Close the shared HTTP session and the parse process pool"""
+        global _PARSE_POOL
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if _PARSE_POOL is not None:
+            _PARSE_POOL.shutdown(wait=False, cancel_futures=True)
+            _PARSE_POOL = None
+    
+    @property
+    def client(self) -> "GoogleAdsClient":
+        return get_ads_client()
     
     async def discover_keywords(self, brand_website: str, competitor_website: str = None, locations: List[str] = None) -> Dict:
         """Main keyword discovery function"""
         try:
-            # Step 1: Extract seed keywords from websites
-            seed_keywords = await self.extract_seed_keywords(brand_website)
+            # Step 1: Extract seed keywords from websites (fetched concurrently)
             if competitor_website:
-                comp_seeds = await self.extract_seed_keywords(competitor_website)
-                seed_keywords.extend(comp_seeds)
+                brand_seeds, comp_seeds = await asyncio.gather(
+                    self.extract_seed_keywords(brand_website),
+                    self.extract_seed_keywords(competitor_website)
+                )
+                seed_keywords = brand_seeds + comp_seeds
+            else:
+                seed_keywords = await self.extract_seed_keywords(brand_website)
             
             # Step 2: Get keyword ideas from Google Ads API
             keyword_ideas = await self.get_keyword_ideas_from_google(seed_keywords)
             
-            # Step 3: Filter keywords (search volume >= 500)
-            filtered_keywords = [
-                kw for kw in keyword_ideas 
-                if kw.get('search_volume', 0) >= 500
-            ]
-            
-            # Step 4: Group keywords into ad groups
-            ad_groups = self.group_keywords_into_ad_groups(filtered_keywords)
+            # Step 3: Filter, group into ad groups, tally themes and price CPCs in one pass
+            filtered_keywords, ad_groups, theme_stats, cpc_recommendations = self._analyze_keywords(keyword_ideas)
             
             return {
                 'total_keywords': len(filtered_keywords),
                 'keywords': filtered_keywords,
                 'ad_groups': ad_groups,
+                'theme_stats': theme_stats,
+                'cpc_recommendations': cpc_recommendations,
                 'seed_keywords_used': seed_keywords
             }
             
@@ -57,37 +264,47 @@ class KeywordPlannerService:
     async def extract_seed_keywords(self, website_url: str) -> List[str]:
         """Extract seed keywords from website content"""
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(website_url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract text from title, meta description, h1, h2 tags
-            text_content = []
-            
-            if soup.title:
-                text_content.append(soup.title.get_text())
-            
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc:
-                text_content.append(meta_desc.get('content', ''))
-            
-            headings = soup.find_all(['h1', 'h2', 'h3'])
-            text_content.extend([h.get_text() for h in headings])
-            
-            # Basic keyword extraction
-            all_text = ' '.join(text_content).lower()
-            words = re.findall(r'\b[a-zA-Z]{3,}\b', all_text)
-            
-            # Remove common stop words and get unique keywords
-            stop_words = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'her', 'was', 'one', 'our', 'had', 'but', 'words', 'use', 'each', 'which', 'she', 'how', 'its', 'said', 'from', 'they', 'this', 'been', 'have', 'their', 'with', 'that'}
-            keywords = list(set([word for word in words if word not in stop_words]))
-            
-            return keywords[:10]  # Return top 10
+            return await self._fetch_seed_keywords(website_url)
             
         except Exception as e:
             print(f"Error extracting keywords from {website_url}: {e}")
             return ["digital marketing", "online services", "web solutions", "business consulting"]
     
+    @_async_ttl_cache()
+    async def _fetch_seed_keywords(self, website_url: str) -> List[str]:
+        """Fetch and parse a website; raises on failure so fallbacks are never cached"""
+        host = urlparse(website_url).netloc
+        if not host:
+            # Schemeless input like "example.com" has no netloc and cannot be fetched anyway
+            raise ValueError(f"URL has no host: {website_url}")
+        
+        # Bound the wait so a burst against one host fails fast instead of queueing forever
+        await asyncio.wait_for(_host_limiter(host).acquire(), timeout=_HOST_WAIT_TIMEOUT)
+        
+        session = self._get_session()
+        async with SCRAPE_SEM:
+            async with session.get(website_url) as response:
+                # 403/429/5xx bodies are block pages, not site content
+                response.raise_for_status()
+                
+                # Seeds come from <head> and the first headings, so stop reading once
+                # enough of the page is in; lxml copes with the truncated markup
+                buf = bytearray()
+                async for chunk in response.content.iter_chunked(16384):
+                    buf.extend(chunk)
+                    if len(buf) >= _MAX_PAGE_BYTES:
+                        break
+                body = bytes(buf)
+        
+        # Parse off the event loop so other requests keep being served; large
+        # pages go to a process so the parse does not hold this worker's GIL
+        if len(body) >= _PROCESS_PARSE_THRESHOLD:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_get_parse_pool(), _parse_seeds, body)
+        return await asyncio.to_thread(_parse_seeds, body)
+    
+    # Keyed on seed order too: only the first 10 seeds are used and their position shapes the ideas
+    @_async_ttl_cache(key=lambda seed_keywords: hashkey(tuple(seed_keywords)))
     async def get_keyword_ideas_from_google(self, seed_keywords: List[str]) -> List[Dict]:
         """Get keyword ideas using Google Ads API - with fallback to mock data"""
         try:
@@ -96,19 +313,11 @@ class KeywordPlannerService:
             print(f"API call would use seeds: {seed_keywords}")
             
             # Mock keyword data based on seed keywords
-            mock_keywords = []
-            base_volumes = [1000, 2500, 5000, 1200, 800, 3200, 4500, 600, 1800, 2200]
-            competitions = ['LOW', 'MEDIUM', 'HIGH']
-            
-            for i, seed in enumerate(seed_keywords[:10]):
-                for suffix in ['', ' online', ' shop', ' buy', ' best', ' reviews']:
-                    mock_keywords.append({
-                        'keyword': f"{seed}{suffix}".strip(),
-                        'search_volume': base_volumes[i % len(base_volumes)] + i * 100,
-                        'competition': competitions[i % len(competitions)],
-                        'cpc_low': round(0.5 + (i * 0.3), 2),
-                        'cpc_high': round(1.2 + (i * 0.4), 2),
-                    })
+            mock_keywords = [
+                {'keyword': f"{seed}{suffix}".strip(), **metrics}
+                for seed, metrics in _mock_seed_metrics(seed_keywords[:10])
+                for suffix in _SUFFIXES
+            ]
             
             print(f"Returning {len(mock_keywords)} mock keywords")
             return mock_keywords
@@ -144,15 +353,17 @@ class KeywordPlannerService:
             return keywords
             """
             
-        except GoogleAdsException as ex:
+        except _google_ads_exception() as ex:
             print(f"Google Ads API error: {ex}")
             return []
         except Exception as e:
             print(f"General error in API call: {e}")
             return []
     
-    def group_keywords_into_ad_groups(self, keywords: List[Dict]) -> Dict:
-        """Group keywords into logical ad groups"""
+    def _analyze_keywords(self, keyword_ideas: List[Dict]) -> Tuple[List[Dict], Dict, Dict, Dict]:
+        """Filter, group, summarise and recommend CPCs for keyword ideas in a single pass"""
+        filtered_keywords = []
+        cpc_recommendations = {}
         ad_groups = {
             'brand_terms': [],
             'category_terms': [],
@@ -160,20 +371,51 @@ class KeywordPlannerService:
             'location_terms': [],
             'long_tail_terms': []
         }
+        theme_stats = {
+            theme: {'keywords': 0, 'estimated_reach': 0}
+            for theme in ('high_volume', 'long_tail', 'location')
+        }
+        high_volume = theme_stats['high_volume']
+        long_tail = theme_stats['long_tail']
+        location = theme_stats['location']
         
-        for keyword in keywords:
+        for keyword in keyword_ideas:
+            # Filter keywords (search volume >= 500)
+            volume = keyword.get('search_volume', 0)
+            if volume < 500:
+                continue
+            filtered_keywords.append(keyword)
+            
+            # CPC recommendations based on competition
+            avg_cpc = (keyword['cpc_low'] + keyword['cpc_high']) / 2
+            target_cpa = avg_cpc / _CONVERSION_RATE
+            cpc_recommendations[keyword['keyword']] = {
+                "suggested_cpc": round(avg_cpc, 2),
+                "target_cpa": round(target_cpa, 2),
+                "competition": keyword['competition'],
+                "priority": "HIGH" if volume > 10000 and keyword['competition'] == 'MEDIUM' else "MEDIUM"
+            }
+            
+            if volume > 5000:
+                high_volume['keywords'] += 1
+                high_volume['estimated_reach'] += volume
+            
             kw_text = keyword['keyword'].lower()
             
             # Simple grouping logic
-            if len(kw_text.split()) >= 3:
+            if kw_text.count(' ') >= 2:
                 ad_groups['long_tail_terms'].append(keyword)
-            elif any(comp in kw_text for comp in ['vs', 'versus', 'compared', 'alternative']):
+                long_tail['keywords'] += 1
+                long_tail['estimated_reach'] += volume
+            elif _COMPETITOR_RE.search(kw_text):
                 ad_groups['competitor_terms'].append(keyword)
-            elif any(loc in kw_text for loc in ['near me', 'local', 'city', 'area']):
+            elif _LOCATION_RE.search(kw_text):
                 ad_groups['location_terms'].append(keyword)
+                location['keywords'] += 1
+                location['estimated_reach'] += volume
             elif keyword['competition'] == 'HIGH':
                 ad_groups['brand_terms'].append(keyword)
             else:
                 ad_groups['category_terms'].append(keyword)
         
-        return ad_groups
\ No newline at end of file
+        return filtered_keywords, ad_groups, theme_stats, cpc_recommendations
\ No newline at end of file
@@ -1,11 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Optional
 from keyword_service import KeywordPlannerService
 import asyncio
+import os
 
-app = FastAPI(title="SEM Planner API", version="1.0.0")
+# Serialize plain responses with orjson; endpoints with large payloads return an
+# ORJSONResponse directly so FastAPI's jsonable_encoder pass is skipped too
+app = FastAPI(title="SEM Planner API", version="1.0.0", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,16 +28,13 @@ class SEMAnalysisRequest(BaseModel):
     search_budget: int
     pmax_budget: int
 
-class KeywordAnalysisResponse(BaseModel):
-    total_keywords: int
-    keywords: List[dict]
-    ad_groups: dict
-    campaign_suggestions: dict
-    cpc_recommendations: dict
-
 # Initialize services
 keyword_service = KeywordPlannerService()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await keyword_service.close()
+
 @app.get("/")
 def read_root():
     return {"message": "SEM Planner API is running!", "version": "1.0.0"}
@@ -64,7 +65,7 @@ async def analyze_sem_campaign(request: SEMAnalysisRequest):
         if 'error' in keyword_data:
             raise HTTPException(status_code=400, detail=keyword_data['error'])
         
-        # Calculate CPC recommendations and campaign suggestions
+        # CPC recommendations come from the service's keyword pass; add campaign suggestions
         campaign_suggestions = calculate_campaign_suggestions(
             keyword_data,
             request.shopping_budget,
@@ -72,19 +73,16 @@ async def analyze_sem_campaign(request: SEMAnalysisRequest):
             request.pmax_budget
         )
         
-        cpc_recommendations = calculate_cpc_recommendations(
-            keyword_data['keywords'],
-            request.shopping_budget + request.search_budget + request.pmax_budget
-        )
-        
-        return {
+        # Returned as a Response so FastAPI skips jsonable_encoder over the
+        # already-clean keyword payload and hands it straight to orjson
+        return ORJSONResponse({
             "total_keywords": keyword_data['total_keywords'],
             "keywords": keyword_data['keywords'],
             "ad_groups": keyword_data['ad_groups'],
             "campaign_suggestions": campaign_suggestions,
-            "cpc_recommendations": cpc_recommendations,
+            "cpc_recommendations": keyword_data['cpc_recommendations'],
             "seed_keywords_used": keyword_data.get('seed_keywords_used', [])
-        }
+        })
         
     except Exception as e:
         print(f"Error in analyze_sem_campaign: {e}")
@@ -101,25 +99,22 @@ def calculate_campaign_suggestions(keyword_data: dict, shopping_budget: int, sea
         "seasonal_themes": []
     }
     
-    # Analyze keywords to suggest themes
-    all_keywords = keyword_data['keywords']
+    # Themes are tallied by the keyword service while it groups keywords
+    theme_stats = keyword_data['theme_stats']
     
     # Product category themes
-    product_keywords = [kw for kw in all_keywords if kw['search_volume'] > 5000]
     themes['product_category_themes'] = [
-        {"theme": "High Volume Products", "keywords": len(product_keywords), "estimated_reach": sum(kw['search_volume'] for kw in product_keywords)}
+        {"theme": "High Volume Products", **theme_stats['high_volume']}
     ]
     
     # Use case themes  
-    long_tail = keyword_data['ad_groups'].get('long_tail_terms', [])
     themes['use_case_themes'] = [
-        {"theme": "Detailed Solutions", "keywords": len(long_tail), "estimated_reach": sum(kw['search_volume'] for kw in long_tail)}
+        {"theme": "Detailed Solutions", **theme_stats['long_tail']}
     ]
     
     # Demographic themes
-    location_based = keyword_data['ad_groups'].get('location_terms', [])
     themes['demographic_themes'] = [
-        {"theme": "Location-Based Services", "keywords": len(location_based), "estimated_reach": sum(kw['search_volume'] for kw in location_based)}
+        {"theme": "Location-Based Services", **theme_stats['location']}
     ]
     
     return {
@@ -132,27 +127,8 @@ def calculate_campaign_suggestions(keyword_data: dict, shopping_budget: int, sea
         }
     }
 
-def calculate_cpc_recommendations(keywords: List[dict], total_budget: int) -> dict:
-    """Calculate CPC recommendations based on competition and budget"""
-    
-    # Assume 2% conversion rate as per requirements
-    conversion_rate = 0.02
-    
-    recommendations = {}
-    
-    for keyword in keywords:
-        avg_cpc = (keyword['cpc_low'] + keyword['cpc_high']) / 2
-        target_cpa = avg_cpc / conversion_rate
-        
-        recommendations[keyword['keyword']] = {
-            "suggested_cpc": round(avg_cpc, 2),
-            "target_cpa": round(target_cpa, 2),
-            "competition": keyword['competition'],
-            "priority": "HIGH" if keyword['search_volume'] > 10000 and keyword['competition'] == 'MEDIUM' else "MEDIUM"
-        }
-    
-    return recommendations
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Set WEB_CONCURRENCY to run more workers so HTML parsing scales past one GIL.
+    # Scrape limits and caches are per worker, so each extra worker multiplies them.
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
\ No newline at end of file
@@ -3,12 +3,20 @@ from keyword_service import KeywordPlannerService  # or wherever your class is
 
 service = KeywordPlannerService()
 
+async def run_discovery():
+    try:
+        return await service.discover_keywords(
+            "https://example.com", 
+            "https://competitor.com"
+        )
+    finally:
+        await service.close()
+
 def test():
-    res = service.discover_keywords(
-        "https://example.com", 
-        "https://competitor.com"
-    )
+    res = asyncio.run(run_discovery())
     print(res)
+    # A coroutine object here would mean discovery never actually ran
+    assert isinstance(res, dict) and 'keywords' in res, res
 
 if __name__ == "__main__":
     test()